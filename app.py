@@ -1,20 +1,36 @@
+import io
 import os
-import uuid
 import re
+import hashlib
 import logging
 import sys
-from datetime import datetime, date, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, session, abort
+import tempfile
+import time
+from datetime import date, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, make_response, g
 from flask_sqlalchemy import SQLAlchemy
-from flask_wtf.csrf import CSRFProtect
+import sqlite3
+from sqlalchemy import select, update, bindparam, lambda_stmt, event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, configure_mappers
+from sqlalchemy.pool import NullPool
+from sqlalchemy.exc import IntegrityError
+from flask_wtf import FlaskForm
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+from wtforms import StringField, PasswordField, TextAreaField, DateField
+from wtforms.validators import DataRequired, InputRequired, Length, Regexp
+from flask_caching import Cache
+from flask_compress import Compress
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
-import pyqrcode
+import segno
 from dotenv import load_dotenv
-from functools import wraps
+from collections import defaultdict
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from flask_apscheduler import APScheduler
-import urllib.parse
 from flask_migrate import Migrate
+from jinja2 import FileSystemBytecodeCache
 
 # ───── Load environment variables ─────
 load_dotenv()
@@ -30,7 +46,14 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a-secure-dev-secret-key-chan
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['WTF_CSRF_ENABLED'] = True
 
+# Password hashing method/cost is tunable per deployment; scrypt runs in
+# OpenSSL's C implementation and costs a fraction of PBKDF2's CPU per login
+# at equivalent security. Older pbkdf2 hashes keep verifying and are
+# rehashed on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
 # ───── Enhanced Database Configuration ─────
+@lru_cache(maxsize=1)
 def is_pythonanywhere():
     """Enhanced detection for PythonAnywhere environment"""
     return (
@@ -57,6 +80,16 @@ def configure_database():
             
             database_url = f'mysql+mysqlconnector://{username}:{password}@{hostname}/{databasename}'
             app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+            # Size the pool for concurrent workers and validate connections
+            # before use so idle-timeout kills don't surface as request errors.
+            # PythonAnywhere drops idle MySQL connections after ~300s, so
+            # recycle under that cutoff to avoid "server has gone away" storms.
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+                'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+                'max_overflow': 5,
+                'pool_pre_ping': True,
+                'pool_recycle': 280,
+            }
             logger.info("✅ Using MySQL for PythonAnywhere")
             return "mysql"
         else:
@@ -73,6 +106,28 @@ def configure_database():
 # Configure database
 db_type = configure_database()
 
+# SQLite holds the whole database in one file; NullPool hands the file handle
+# back after every request so a dev server with threads never deadlocks on a
+# pooled connection holding a transaction open.
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': NullPool,
+        'connect_args': {'check_same_thread': False, 'timeout': 30},
+    }
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Enable WAL and relax fsync cost on every new SQLite connection."""
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Map up to 256MB of the database file so hot pages are read straight
+        # from the page cache instead of through read() syscalls.
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # ───── Mail Configuration ─────
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
 app.config['MAIL_PORT'] = 587
@@ -80,24 +135,119 @@ app.config['MAIL_USE_TLS'] = True
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
+# Seconds to pause between alert sends; e.g. 2.0 keeps a big batch at
+# 30 msg/min, under Gmail's burst limits. 0 disables the throttle.
+MAIL_SEND_INTERVAL = float(os.getenv('MAIL_SEND_INTERVAL', '0'))
 
 # ───── Scheduler Configuration ─────
 app.config['SCHEDULER_API_ENABLED'] = True
+# Persist jobs next to the app data so a restarted process picks up where it
+# left off; coalesce collapses a backlog of missed runs into a single one and
+# max_instances stops a slow SMTP session from overlapping the next trigger.
+# The URL set here is provisional — it is replaced with the engine's resolved
+# URL once SQLAlchemy is initialised, see below the extensions block.
+app.config['SCHEDULER_JOBSTORES'] = {
+    'default': {'type': 'sqlalchemy', 'url': app.config['SQLALCHEMY_DATABASE_URI']}
+}
+app.config['SCHEDULER_EXECUTORS'] = {
+    'default': {'type': 'threadpool', 'max_workers': 2}
+}
+app.config['SCHEDULER_JOB_DEFAULTS'] = {
+    'coalesce': True,
+    'max_instances': 1,
+    'misfire_grace_time': 3600,
+}
+
+# Templates never change under a running production process; skip the
+# per-render mtime stat Jinja does when auto-reload is on.
+if is_pythonanywhere():
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+
+# Cache compiled templates as bytecode on disk so a fresh process (or each
+# gunicorn worker) reloads them instead of re-parsing every template.
+_jinja_cache_dir = os.path.join(tempfile.gettempdir(), 'promed_jinja_cache')
+os.makedirs(_jinja_cache_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=_jinja_cache_dir)
+
+def _warm_template_cache():
+    """Compile every template once at startup so first requests skip it."""
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            logger.warning(f"Template preload failed for {name}: {e}")
+
+_warm_template_cache()
 
 # ───── Extensions ─────
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
+# Compress responses above 512 bytes; the medicine list is repetitive markup
+# that shrinks 5-10x under Brotli/gzip. Tiny responses aren't worth the CPU.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 512
+compress = Compress(app)
 mail = Mail(app)
 scheduler = APScheduler()
 
+# APScheduler's SQLAlchemy jobstore resolves a relative sqlite:/// URL
+# against the process CWD, while Flask-SQLAlchemy resolves the same URI into
+# the instance folder. Point the jobstore at the engine's resolved URL so
+# jobs land in the application database instead of a stray promed.db.
+with app.app_context():
+    app.config['SCHEDULER_JOBSTORES']['default']['url'] = \
+        db.engine.url.render_as_string(hide_password=False)
+
+# Server-side sessions are opt-in: point SESSION_REDIS_URL at a Redis
+# instance and the cookie shrinks to a session id, the per-request HMAC
+# re-sign goes away, and session state is shared across gunicorn workers.
+# Without it (local dev, plain PA) signed-cookie sessions stand.
+_session_redis_url = os.getenv('SESSION_REDIS_URL')
+if _session_redis_url:
+    try:
+        import redis
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'redis'
+        app.config['SESSION_REDIS'] = redis.from_url(_session_redis_url)
+        Session(app)
+        logger.info("✅ Using Redis-backed server-side sessions")
+    except ImportError as e:
+        logger.warning(f"SESSION_REDIS_URL set but Redis session support unavailable ({e}); "
+                       "falling back to cookie sessions")
+
+# Opt-in N+1 detector for development: NPLUSONE=1 makes any lazy relationship
+# load raise, so a template quietly dereferencing medicine.owner fails loudly
+# before it ships. Never enabled in production.
+if os.getenv('NPLUSONE') == '1' and not is_pythonanywhere():
+    try:
+        from nplusone.ext.flask_sqlalchemy import NPlusOne
+        app.config['NPLUSONE_RAISE'] = True
+        NPlusOne(app)
+        logger.info("✅ nplusone lazy-load detection enabled")
+    except ImportError:
+        logger.warning("NPLUSONE=1 set but the nplusone package is not installed")
+
+@app.teardown_appcontext
+def _shutdown_session(exception=None):
+    """Return the scoped session (and its pooled connection) after each request."""
+    db.session.remove()
+
 # ───── Database Models ─────
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    username = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password = db.Column(db.String(255), nullable=False)
-    medicines = db.relationship('Medicine', backref='owner', lazy=True, cascade='all, delete-orphan')
+    # Monotonic listing version, bumped on every medicine add/delete. SQLite
+    # reuses freed rowids, so (max id, count) can repeat after delete+add;
+    # this counter only ever moves forward.
+    list_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # selectin batches the collection into one IN query per result set rather
+    # than one lazy SELECT per accessed user.
+    medicines = db.relationship('Medicine', backref='owner', lazy='selectin',
+                                cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -112,11 +262,86 @@ class Medicine(db.Model):
     qr_code = db.Column(db.String(260), nullable=False)
     expiry_alert_sent_prior = db.Column(db.Boolean, default=False)
     expiry_alert_sent_expiry_day = db.Column(db.Boolean, default=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # 16-byte blake2s digest of the QR payload; indexed so duplicate checks
+    # are a point lookup on fixed-width bytes instead of comparing text columns.
+    sig = db.Column(db.LargeBinary(16), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    __table_args__ = (
+        # Serves view_medicines' filter_by(user_id=...).order_by(expiry_date)
+        # without a separate sort step.
+        db.Index('ix_medicine_user_expiry', 'user_id', 'expiry_date'),
+        # Match the nightly scheduler's predicates so the scan is an index
+        # range lookup instead of a full-table pass.
+        db.Index('ix_medicine_expiry_scan', 'expiry_date', 'expiry_alert_sent_prior'),
+        db.Index('ix_medicine_expiry_day', 'expiry_date', 'expiry_alert_sent_expiry_day'),
+    )
 
     def __repr__(self):
         return f'<Medicine {self.name}>'
 
+# ───── Precompiled Statements ─────
+# lambda_stmt lets SQLAlchemy cache the compiled SQL for these hot lookups,
+# so repeated logins/detail views skip statement compilation entirely.
+# Mappers must be configured first so the 'owner' backref exists.
+configure_mappers()
+# Login needs four columns, not a mapped entity: fetching a plain Row skips
+# ORM hydration and identity-map bookkeeping on the hottest query.
+_user_by_login_stmt = lambda_stmt(
+    lambda: select(User.id, User.username, User.email, User.password).where(
+        (User.username == bindparam('login')) | (User.email == bindparam('login'))
+    )
+)
+
+# Ownership is part of the WHERE clause: a miss and a foreign row are both
+# "not found", and the User table is never touched for the check.
+_medicine_detail_stmt = lambda_stmt(
+    lambda: select(Medicine).where(
+        Medicine.id == bindparam('med_id'),
+        Medicine.user_id == bindparam('owner_id'),
+    )
+)
+
+# ───── Forms ─────
+# Declarative validators compile their patterns once at class definition,
+# replacing the per-request strip/if-chain validation in the route bodies.
+def _strip_filter(value):
+    return value.strip() if isinstance(value, str) else value
+
+def _lower_filter(value):
+    return value.lower() if isinstance(value, str) else value
+
+class SignupForm(FlaskForm):
+    # Lowercased at write time so the case-folded login input always matches
+    # the stored value with a plain unique-index probe.
+    username = StringField('Username', filters=[_strip_filter, _lower_filter], validators=[
+        DataRequired(message='All fields are required.'), Length(max=100)])
+    email = StringField('Email', filters=[_strip_filter, _lower_filter], validators=[
+        DataRequired(message='All fields are required.'),
+        Regexp(r'^[\w\.-]+@[\w\.-]+\.\w+$', message='Invalid email format.')])
+    password = PasswordField('Password', filters=[_strip_filter], validators=[
+        DataRequired(message='All fields are required.'),
+        Length(min=6, message='Password must be at least 6 characters.')])
+
+class LoginForm(FlaskForm):
+    login_input = StringField('Username or Email', filters=[_strip_filter, _lower_filter],
+                              validators=[DataRequired()])
+    password = PasswordField('Password', filters=[_strip_filter], validators=[DataRequired()])
+
+class MedicineForm(FlaskForm):
+    name = StringField('Name', filters=[_strip_filter], validators=[
+        DataRequired(message='All fields are required.'), Length(max=100)])
+    factory_name = StringField('Factory', filters=[_strip_filter], validators=[
+        DataRequired(message='All fields are required.'), Length(max=100)])
+    # InputRequired (not DataRequired) so a malformed date keeps its coercion
+    # error instead of being reported as a missing field.
+    manufacturing_date = DateField('Manufacturing Date', format='%Y-%m-%d',
+                                   validators=[InputRequired(message='All fields are required.')])
+    expiry_date = DateField('Expiry Date', format='%Y-%m-%d',
+                            validators=[InputRequired(message='All fields are required.')])
+    uses = TextAreaField('Uses', filters=[_strip_filter], validators=[
+        DataRequired(message='All fields are required.')])
+
 # ───── Database Initialization Function ─────
 def initialize_database():
     """Initialize database tables with proper error handling"""
@@ -144,115 +369,262 @@ def initialize_database():
     return True
 
 # ───── Helper Functions ─────
+@app.before_request
+def _load_user():
+    """Decode the signed session cookie once and stash the user id on g."""
+    g.user_id = session.get('user_id')
+
+@app.after_request
+def _immutable_qr_cache(response):
+    """QR filenames are content hashes, so browsers may cache them forever.
+
+    Scoped to the qrcodes folder only — css/js/images keep Flask's default
+    max-age since their names don't change when their contents do.
+    """
+    if request.path.startswith('/static/qrcodes/') and response.status_code == 200:
+        response.cache_control.no_cache = None  # clear Flask's static default
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+    return response
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if g.user_id is None:
             flash("Please log in to access this page.", "warning")
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
+_EMAIL_RE = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
+
 def is_valid_email(email):
-    return re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', email) is not None
+    return _EMAIL_RE.match(email) is not None
+
+# Password hashing runs on a small worker pool: the PBKDF2 loop releases the
+# GIL inside OpenSSL, so other requests keep running while a hash computes.
+_hash_executor = ThreadPoolExecutor(max_workers=2)
+
+def hash_password(password):
+    return _hash_executor.submit(
+        generate_password_hash, password, method=PASSWORD_HASH_METHOD, salt_length=16
+    ).result()
+
+def verify_password(stored_hash, password):
+    return _hash_executor.submit(check_password_hash, stored_hash, password).result()
+
+# Verified against when a login names no existing user, so the unknown-user
+# and wrong-password paths cost the same hash work and time.
+_DUMMY_HASH = generate_password_hash(os.urandom(16).hex(),
+                                     method=PASSWORD_HASH_METHOD, salt_length=16)
+
+def password_needs_rehash(stored_hash):
+    """True when the stored hash's method or cost differs from the configured one."""
+    return stored_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
 
 # Create QR codes directory
 QR_FOLDER = os.path.join(app.root_path, 'static', 'qrcodes')
 os.makedirs(QR_FOLDER, exist_ok=True)
 
+# QR encoding is CPU work the user never needs to wait for: the row is
+# committed first and the PNG is rendered on this small background pool.
+_qr_executor = ThreadPoolExecutor(max_workers=2)
+
+def _render_qr_file(medicine_url, file_path):
+    """Encode and write a QR PNG; runs on the background executor.
+
+    The PNG is encoded into memory and published with os.replace so the
+    static handler can never serve a half-written file.
+    """
+    try:
+        if not os.path.exists(file_path):
+            buf = io.BytesIO()
+            segno.make(medicine_url, error='m').save(buf, kind='png', scale=6)
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(buf.getbuffer())
+            os.replace(tmp_path, file_path)
+    except Exception as e:
+        logger.error(f"QR render failed for {file_path}: {e}")
+
 # ───── Email Alerts Function ─────
 def send_expiry_alerts():
     with app.app_context():
         logger.info("Starting expiry alerts check...")
 
+        # Bail before touching the database or SMTP when mail isn't configured.
+        if not (app.config['MAIL_USERNAME'] and app.config['MAIL_PASSWORD']):
+            logger.error("Mail credentials not configured; skipping expiry alerts")
+            return
+
         today = date.today()
         tomorrow = today + timedelta(days=1)
 
-        warning_meds = Medicine.query.filter(
-            Medicine.expiry_date == tomorrow,
-            Medicine.expiry_alert_sent_prior == False
+        # One round trip covers both categories: fetch the two candidate days
+        # with their flags and partition in Python. On the common no-expiries
+        # day this single indexed query comes back empty and the job is done.
+        rows = db.session.execute(
+            select(Medicine.id, Medicine.name, Medicine.factory_name,
+                   Medicine.expiry_date, Medicine.expiry_alert_sent_prior,
+                   Medicine.expiry_alert_sent_expiry_day, User.email)
+            .join(User, User.id == Medicine.user_id)
+            .where(Medicine.expiry_date.in_((today, tomorrow)))
         ).all()
+        if not rows:
+            logger.info("No medicines expiring today or tomorrow")
+            return
 
-        expired_meds = Medicine.query.filter(
-            Medicine.expiry_date == today,
-            Medicine.expiry_alert_sent_expiry_day == False
-        ).all()
+        warning_meds = [r for r in rows
+                        if r.expiry_date == tomorrow and not r.expiry_alert_sent_prior]
+        expired_meds = [r for r in rows
+                        if r.expiry_date == today and not r.expiry_alert_sent_expiry_day]
 
         logger.info(f"Found {len(warning_meds)} medicines expiring tomorrow, {len(expired_meds)} expired today")
 
-        for med in warning_meds:
-            user = User.query.get(med.user_id)
-            if user and user.email:
-                try:
-                    msg = Message(
-                        subject="ProMed – Medicine Will Expire Tomorrow",
-                        sender=app.config['MAIL_USERNAME'],
-                        recipients=[user.email],
-                        body=f"Reminder: '{med.name}' from {med.factory_name} will expire on {med.expiry_date.strftime('%d-%m-%Y')}."
-                    )
-                    mail.send(msg)
-                    med.expiry_alert_sent_prior = True
-                    db.session.commit()
-                    logger.info(f"Sent 24hr warning to {user.email} for {med.name}")
-                except Exception as e:
-                    logger.error(f"Failed to send 24hr warning to {user.email}: {e}")
-                    db.session.rollback()
+        if not warning_meds and not expired_meds:
+            return
+
+        sent_prior_ids = []
+        sent_day_ids = []
 
+        # One message per user per category: a user with five expiring
+        # medicines gets one email listing all five, not five emails.
+        by_user_prior = defaultdict(list)
+        by_user_expiry = defaultdict(list)
+        for med in warning_meds:
+            if med.email:
+                by_user_prior[med.email].append(med)
         for med in expired_meds:
-            user = User.query.get(med.user_id)
-            if user and user.email:
-                try:
-                    msg = Message(
-                        subject="ProMed – Medicine Has Expired",
-                        sender=app.config['MAIL_USERNAME'],
-                        recipients=[user.email],
-                        body=f"Alert: '{med.name}' from {med.factory_name} has expired today ({med.expiry_date.strftime('%d-%m-%Y')})."
+            if med.email:
+                by_user_expiry[med.email].append(med)
+
+        # A single SMTP session covers the whole batch: one TCP + TLS + AUTH
+        # handshake instead of one per message. no_autoflush keeps the ORM
+        # from flushing mid-loop; flags are persisted once in bulk below.
+        # Once a few sends have failed and they make up a third of attempts,
+        # the SMTP server is likely down and the rest of the batch is abandoned
+        # for the next run rather than burning quota on doomed retries.
+        attempts = failures = 0
+        aborted = False
+        try:
+            with mail.connect() as conn, db.session.no_autoflush:
+                for email, meds in by_user_prior.items():
+                    lines = "\n".join(
+                        f"- '{m.name}' from {m.factory_name} will expire on {m.expiry_date.strftime('%d-%m-%Y')}."
+                        for m in meds
                     )
-                    mail.send(msg)
-                    med.expiry_alert_sent_expiry_day = True
-                    db.session.commit()
-                    logger.info(f"Sent expired alert to {user.email} for {med.name}")
-                except Exception as e:
-                    logger.error(f"Failed to send expired alert to {user.email}: {e}")
-                    db.session.rollback()
+                    attempts += 1
+                    try:
+                        msg = Message(
+                            subject="ProMed – Medicine Will Expire Tomorrow",
+                            sender=app.config['MAIL_USERNAME'],
+                            recipients=[email],
+                            body=f"Reminder, the following medicines expire tomorrow:\n{lines}"
+                        )
+                        conn.send(msg)
+                        sent_prior_ids.extend(m.id for m in meds)
+                        logger.info(f"Sent 24hr warning to {email} for {len(meds)} medicine(s)")
+                        if MAIL_SEND_INTERVAL:
+                            time.sleep(MAIL_SEND_INTERVAL)
+                    except Exception as e:
+                        failures += 1
+                        logger.error(f"Failed to send 24hr warning to {email}: {e}")
+                        if failures >= 3 and failures * 3 >= attempts:
+                            aborted = True
+                            break
+
+                if not aborted:
+                    for email, meds in by_user_expiry.items():
+                        lines = "\n".join(
+                            f"- '{m.name}' from {m.factory_name} has expired today ({m.expiry_date.strftime('%d-%m-%Y')})."
+                            for m in meds
+                        )
+                        attempts += 1
+                        try:
+                            msg = Message(
+                                subject="ProMed – Medicine Has Expired",
+                                sender=app.config['MAIL_USERNAME'],
+                                recipients=[email],
+                                body=f"Alert, the following medicines have expired:\n{lines}"
+                            )
+                            conn.send(msg)
+                            sent_day_ids.extend(m.id for m in meds)
+                            logger.info(f"Sent expired alert to {email} for {len(meds)} medicine(s)")
+                            if MAIL_SEND_INTERVAL:
+                                time.sleep(MAIL_SEND_INTERVAL)
+                        except Exception as e:
+                            failures += 1
+                            logger.error(f"Failed to send expired alert to {email}: {e}")
+                            if failures >= 3 and failures * 3 >= attempts:
+                                aborted = True
+                                break
+
+                if aborted:
+                    logger.error(f"Aborting alert batch: {failures}/{attempts} sends failed; remaining alerts retry next run")
+        except Exception as e:
+            logger.error(f"Could not open SMTP connection for expiry alerts: {e}")
+
+        # Two bulk UPDATEs and one commit cover every notified row; failed
+        # sends never enter the id lists and are retried on the next run.
+        try:
+            if sent_prior_ids:
+                db.session.execute(
+                    update(Medicine)
+                    .where(Medicine.id.in_(sent_prior_ids))
+                    .values(expiry_alert_sent_prior=True)
+                )
+            if sent_day_ids:
+                db.session.execute(
+                    update(Medicine)
+                    .where(Medicine.id.in_(sent_day_ids))
+                    .values(expiry_alert_sent_expiry_day=True)
+                )
+            if sent_prior_ids or sent_day_ids:
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to persist alert flags: {e}")
+            db.session.rollback()
 
 # ───── Routes ─────
+def _public_page_key():
+    """Cache key for static pages; the navbar differs for logged-in users."""
+    return f"{request.endpoint}:{'auth' if 'user_id' in session else 'anon'}"
+
+def _has_pending_flashes():
+    return '_flashes' in session
+
 @app.route('/')
+@cache.cached(timeout=3600, key_prefix=_public_page_key, unless=_has_pending_flashes)
 def home():
     return render_template('home.html')
 
 @app.route('/about_us')
+@cache.cached(timeout=3600, key_prefix=_public_page_key, unless=_has_pending_flashes)
 def about_us():
     return render_template('about_us.html')
 
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
-    if request.method == 'POST':
+    form = SignupForm()
+    if form.validate_on_submit():
         try:
-            username = request.form.get('username', '').strip()
-            email = request.form.get('email', '').strip().lower()
-            password = request.form.get('password', '').strip()
-
-            # Enhanced validation
-            if not all([username, email, password]):
-                flash('All fields are required.', 'danger')
-                return render_template('signup.html')
-            
-            if not is_valid_email(email):
-                flash('Invalid email format.', 'danger')
-                return render_template('signup.html')
-                
-            if len(password) < 6:
-                flash('Password must be at least 6 characters.', 'danger')
-                return render_template('signup.html')
+            username = form.username.data
+            email = form.email.data
+            password = form.password.data
 
             # Check for existing user with better error handling
             try:
-                existing_user = User.query.filter(
-                    (User.username == username) | (User.email == email)
-                ).first()
-                
-                if existing_user:
+                # Two point lookups on the unique indexes; an OR across both
+                # columns defeats index use on most planners. Short-circuits
+                # after the first hit.
+                taken = db.session.execute(
+                    select(User.id).where(User.username == username)
+                ).first() is not None or db.session.execute(
+                    select(User.id).where(User.email == email)
+                ).first() is not None
+
+                if taken:
                     flash('Username or email already registered.', 'danger')
                     return render_template('signup.html')
                     
@@ -263,7 +635,7 @@ def signup():
 
             # Create new user
             try:
-                hashed_password = generate_password_hash(password)
+                hashed_password = hash_password(password)
                 new_user = User(username=username, email=email, password=hashed_password)
                 db.session.add(new_user)
                 db.session.commit()
@@ -271,7 +643,12 @@ def signup():
                 logger.info(f"New user created: {username}")
                 flash('Account created successfully! Please log in.', 'success')
                 return redirect(url_for('login'))
-                
+
+            except IntegrityError:
+                # A concurrent signup won the race between the existence check
+                # and our INSERT; the unique constraints are the arbiter.
+                db.session.rollback()
+                flash('Username or email already registered.', 'danger')
             except Exception as create_error:
                 db.session.rollback()
                 logger.error(f"Error creating user: {create_error}")
@@ -280,19 +657,35 @@ def signup():
         except Exception as general_error:
             logger.error(f"Unexpected error in signup: {general_error}")
             flash('An unexpected error occurred. Please try again.', 'danger')
+    elif request.method == 'POST':
+        flash(next(iter(form.errors.values()))[0], 'danger')
 
     return render_template('signup.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    if request.method == 'POST':
+    form = LoginForm()
+    if form.validate_on_submit():
         try:
-            login_input = request.form.get('login_input', '').strip().lower()
-            password = request.form.get('password', '').strip()
-
-            user = User.query.filter((User.username == login_input) | (User.email == login_input)).first()
-
-            if user and check_password_hash(user.password, password):
+            login_input = form.login_input.data
+            password = form.password.data
+
+            user = db.session.execute(
+                _user_by_login_stmt, {'login': login_input}
+            ).first()
+
+            if user is None:
+                # Burn the same hash cost as a real check so response timing
+                # doesn't reveal which usernames exist.
+                verify_password(_DUMMY_HASH, password)
+            if user and verify_password(user.password, password):
+                if password_needs_rehash(user.password):
+                    db.session.execute(
+                        update(User)
+                        .where(User.id == user.id)
+                        .values(password=hash_password(password))
+                    )
+                    db.session.commit()
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['email'] = user.email
@@ -303,6 +696,8 @@ def login():
         except Exception as e:
             logger.error(f"Login error: {e}")
             flash('An error occurred during login. Please try again.', 'danger')
+    elif request.method == 'POST':
+        flash('Invalid credentials.', 'danger')
 
     return render_template('login.html')
 
@@ -315,63 +710,141 @@ def logout():
 @app.route('/add-medicine', methods=['GET', 'POST'])
 @login_required
 def add_medicine():
-    if request.method == 'POST':
+    form = MedicineForm()
+    if form.validate_on_submit():
         try:
-            name = request.form.get('name', '').strip()
-            factory_name = request.form.get('factory_name', '').strip()
-            mfg_date_str = request.form.get('manufacturing_date', '').strip()
-            expiry_date_str = request.form.get('expiry_date', '').strip()
-            uses = request.form.get('uses', '').strip()
-
-            if not all([name, factory_name, mfg_date_str, expiry_date_str, uses]):
-                flash('All fields are required.', 'danger')
+            name = form.name.data
+            factory_name = form.factory_name.data
+            mfg_date = form.manufacturing_date.data
+            expiry_date = form.expiry_date.data
+            uses = form.uses.data
+
+            if expiry_date <= mfg_date:
+                flash('Expiry must be after manufacturing date.', 'danger')
             else:
-                try:
-                    mfg_date = datetime.strptime(mfg_date_str, '%Y-%m-%d').date()
-                    expiry_date = datetime.strptime(expiry_date_str, '%Y-%m-%d').date()
-
-                    if expiry_date <= mfg_date:
-                        flash('Expiry must be after manufacturing date.', 'danger')
-                    else:
-                        filename = f"{uuid.uuid4().hex}.png"
-                        file_path = os.path.join(QR_FOLDER, filename)
-
-                        medicine_url = url_for('qr_scan_handler', name=name, factory=factory_name, 
-                                               mfg=mfg_date, exp=expiry_date, uses=uses, _external=True)
-
-                        pyqrcode.create(medicine_url).png(file_path, scale=6)
-
-                        new_medicine = Medicine(
-                            name=name,
-                            factory_name=factory_name,
-                            manufacturing_date=mfg_date,
-                            expiry_date=expiry_date,
-                            uses=uses,
-                            qr_code=f'qrcodes/{filename}', 
-                            user_id=session['user_id']
-                        )
-                        db.session.add(new_medicine)
-                        db.session.commit()
-                        flash('Medicine added successfully.', 'success')
-                        return redirect(url_for('view_medicines'))
-
-                except ValueError:
-                    flash('Invalid date format. Please use YYYY-MM-DD.', 'danger')
-                except Exception as e:
-                    logger.error(f"Error adding medicine: {e}")
-                    flash('Error adding medicine. Please try again.', 'danger')
+                # The signature stays content-based so exact re-adds
+                # are still caught before anything is inserted.
+                payload = f"{name}|{factory_name}|{mfg_date.isoformat()}|{expiry_date.isoformat()}|{uses}"
+                payload_sig = hashlib.blake2s(payload.encode(), digest_size=16).digest()
+                duplicate = db.session.execute(
+                    select(Medicine.id).where(
+                        Medicine.user_id == g.user_id,
+                        Medicine.sig == payload_sig,
+                    )
+                ).first()
+                if duplicate:
+                    flash('This medicine is already in your list.', 'warning')
+                    return redirect(url_for('view_medicines'))
+
+                new_medicine = Medicine(
+                    name=name,
+                    factory_name=factory_name,
+                    manufacturing_date=mfg_date,
+                    expiry_date=expiry_date,
+                    uses=uses,
+                    qr_code='',
+                    sig=payload_sig,
+                    user_id=g.user_id
+                )
+                db.session.add(new_medicine)
+                db.session.flush()
+
+                # QR encodes a compact /m/<id> URL instead of the full
+                # five-field query string: ~10x smaller payload and a
+                # much smaller matrix to render.
+                medicine_url = url_for('qr_scan_short', medicine_id=new_medicine.id,
+                                       _external=True)
+                digest = hashlib.blake2s(medicine_url.encode(), digest_size=12).hexdigest()
+                filename = f"{digest}.png"
+                file_path = os.path.join(QR_FOLDER, filename)
+                new_medicine.qr_code = f'qrcodes/{filename}'
+
+                db.session.execute(
+                    update(User)
+                    .where(User.id == g.user_id)
+                    .values(list_version=User.list_version + 1)
+                )
+                db.session.commit()
+                _qr_executor.submit(_render_qr_file, medicine_url, file_path)
+                flash('Medicine added successfully.', 'success')
+                return redirect(url_for('view_medicines'))
         except Exception as e:
             logger.error(f"Unexpected error in add_medicine: {e}")
             flash('An unexpected error occurred. Please try again.', 'danger')
+    elif request.method == 'POST':
+        date_errors = form.manufacturing_date.errors + form.expiry_date.errors
+        if any('date value' in e for e in date_errors):
+            flash('Invalid date format. Please use YYYY-MM-DD.', 'danger')
+        else:
+            flash(next(iter(form.errors.values()))[0], 'danger')
 
     return render_template('add_medicine.html')
 
+# Rows per listing page; keeps per-request memory flat as inventories grow.
+MEDICINES_PER_PAGE = 50
+
+@cache.memoize(timeout=60)
+def _render_medicine_list(user_id, stamp, page, csrf):
+    """Render one listing page; memoized on (user_id, stamp, page, csrf).
+
+    The stamp is the user's list_version, bumped on every add and delete, so
+    any mutation produces a new cache key and stale entries age out. csrf is
+    the session's raw CSRF token and is key material only: the delete forms
+    embed csrf_token(), which is session state, so a render primed by one
+    session must never be served to another (it would 400 every delete).
+    """
+    # Fetch one row past the page so has_next costs no extra COUNT query;
+    # with ix_medicine_user_expiry this stays O(page size) at any table size.
+    medicines = db.session.execute(
+        select(Medicine)
+        .options(joinedload(Medicine.owner))
+        .where(Medicine.user_id == user_id)
+        .order_by(Medicine.expiry_date, Medicine.id)
+        .limit(MEDICINES_PER_PAGE + 1)
+        .offset((page - 1) * MEDICINES_PER_PAGE)
+    ).scalars().all()
+    has_next = len(medicines) > MEDICINES_PER_PAGE
+    return render_template('medicine_details.html',
+                           medicines=medicines[:MEDICINES_PER_PAGE],
+                           page=page, has_next=has_next)
+
 @app.route('/medicines')
 @login_required
 def view_medicines():
     try:
-        medicines = Medicine.query.filter_by(user_id=session['user_id']).order_by(Medicine.expiry_date).all()
-        return render_template('medicine_details.html', medicines=medicines)
+        user_id = g.user_id
+        page = max(request.args.get('page', 1, type=int) or 1, 1)
+        # Make sure the session has its raw CSRF token before it becomes
+        # cache-key material (generate_csrf creates it on first use).
+        generate_csrf()
+        csrf_raw = session['csrf_token']
+        stamp = db.session.execute(
+            select(User.list_version).where(User.id == user_id)
+        ).scalar_one()
+        # The cached body embeds a signed CSRF token that hard-expires after
+        # WTF_CSRF_TIME_LIMIT, so an ETag derived from the list alone would
+        # let the browser 304-revalidate a body whose token is already dead.
+        # Folding in the session token scopes the tag to the session, and the
+        # half-lifetime bucket forces a refetch before the token can expire.
+        csrf_ttl = app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+        csrf_bucket = int(time.time()) // (csrf_ttl // 2)
+        etag = hashlib.blake2s(
+            f"{user_id}:{stamp}:{page}:{csrf_raw}:{csrf_bucket}".encode(),
+            digest_size=8).hexdigest()
+        if _has_pending_flashes():
+            # Flash messages are rendered into the page, so neither the
+            # memoized copy nor a 304 may be served while one is pending —
+            # and the response must carry no ETag, or the browser caches
+            # the banner and replays it on every later revalidation.
+            return make_response(_render_medicine_list.uncached(user_id, stamp, page, csrf_raw))
+        # Weak ETags: Flask-Compress rewrites strong tags to "<tag>:gzip"/
+        # ":br" but leaves weak ones alone, so this is the only form the
+        # browser echoes back verbatim and the pre-render 304 can match.
+        if request.if_none_match.contains_weak(etag):
+            return '', 304
+        response = make_response(_render_medicine_list(user_id, stamp, page, csrf_raw))
+        response.set_etag(etag, weak=True)
+        return response
     except Exception as e:
         logger.error(f"Error viewing medicines: {e}")
         flash('Error loading medicines. Please try again.', 'danger')
@@ -381,10 +854,25 @@ def view_medicines():
 @login_required
 def view_medicine(medicine_id):
     try:
-        medicine = Medicine.query.get_or_404(medicine_id)
-        if medicine.user_id != session['user_id']:
-            abort(403)
-        return render_template('view_medicine.html', medicine=medicine)
+        medicine = db.session.execute(
+            _medicine_detail_stmt,
+            {'med_id': medicine_id, 'owner_id': g.user_id}
+        ).scalar_one_or_none()
+        if medicine is None:
+            abort(404)
+        # Medicines are immutable once added, so the id alone is a stable tag.
+        etag = hashlib.blake2s(f"med:{medicine.id}".encode(), digest_size=8).hexdigest()
+        if _has_pending_flashes():
+            # Same rule as view_medicines: a page with a flash baked in must
+            # be neither 304'd nor tagged for the browser's cache.
+            return make_response(render_template('view_medicine.html', medicine=medicine))
+        # Weak for the same reason as view_medicines: Flask-Compress leaves
+        # weak ETags untouched, so the conditional check stays pre-render.
+        if request.if_none_match.contains_weak(etag):
+            return '', 304
+        response = make_response(render_template('view_medicine.html', medicine=medicine))
+        response.set_etag(etag, weak=True)
+        return response
     except Exception as e:
         logger.error(f"Error viewing medicine {medicine_id}: {e}")
         flash('Error loading medicine details.', 'danger')
@@ -394,14 +882,29 @@ def view_medicine(medicine_id):
 @login_required
 def delete_medicine(medicine_id):
     try:
-        medicine = Medicine.query.get_or_404(medicine_id)
-        if medicine.user_id != session['user_id']:
-            abort(403)
+        medicine = db.session.execute(
+            _medicine_detail_stmt,
+            {'med_id': medicine_id, 'owner_id': g.user_id}
+        ).scalar_one_or_none()
+        if medicine is None:
+            abort(404)
 
         try:
-            if os.path.exists(medicine.qr_code):
-                os.remove(medicine.qr_code)
+            # qr_code is stored relative to the static folder; anchor it so
+            # the unlink works no matter what the process CWD is.
+            qr_path = os.path.join(app.static_folder, medicine.qr_code)
+            try:
+                os.remove(qr_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove QR file {qr_path}: {e}")
             db.session.delete(medicine)
+            db.session.execute(
+                update(User)
+                .where(User.id == g.user_id)
+                .values(list_version=User.list_version + 1)
+            )
             db.session.commit()
             flash('Medicine deleted successfully.', 'success')
         except Exception as e:
@@ -415,6 +918,14 @@ def delete_medicine(medicine_id):
 
     return redirect(url_for('view_medicines'))
 
+@app.route('/m/<int:medicine_id>')
+def qr_scan_short(medicine_id):
+    """Resolve the compact URL embedded in newly generated QR codes."""
+    medicine = db.session.get(Medicine, medicine_id)
+    if medicine is None:
+        abort(404)
+    return render_template('qr_scan_result.html', medicine=medicine)
+
 @app.route('/qr-scan')
 def qr_scan_handler():
     medicine_data = {
@@ -450,21 +961,20 @@ def init_db_command():
 
 # ───── Main Execution ─────
 if __name__ == '__main__':
-    # Initialize database when app starts
+    # Initialize database when app starts; initialize_database() already
+    # inspects existing tables and runs create_all itself when needed.
     initialize_database()
-    
-    with app.app_context():
-        db.create_all()  # Backup creation
 
     # Initialize scheduler for production
     if is_pythonanywhere():
         try:
             scheduler.init_app(app)
             scheduler.add_job(
-                id='send_expiry_alerts_job', 
-                func=send_expiry_alerts, 
-                trigger='cron', 
-                hour=8
+                id='send_expiry_alerts_job',
+                func=send_expiry_alerts,
+                trigger='cron',
+                hour=8,
+                replace_existing=True  # job survives in the jobstore across restarts
             )
             scheduler.start()
             logger.info("✅ Scheduler started for email alerts")
@@ -0,0 +1,30 @@
+"""Add indexes for login and per-user medicine listing
+
+Revision ID: b3a7c1f42d88
+Revises: fd14c053a979
+Create Date: 2026-08-30 15:02:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3a7c1f42d88'
+down_revision = 'fd14c053a979'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # user.username already has a unique constraint (and thus an index) from
+    # the initial migration, so only the medicine-side indexes are created here.
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_medicine_user_id'), ['user_id'], unique=False)
+        batch_op.create_index('ix_medicine_user_expiry', ['user_id', 'expiry_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.drop_index('ix_medicine_user_expiry')
+        batch_op.drop_index(batch_op.f('ix_medicine_user_id'))
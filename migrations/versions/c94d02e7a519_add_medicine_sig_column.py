@@ -0,0 +1,28 @@
+"""Add binary payload signature to medicine
+
+Revision ID: c94d02e7a519
+Revises: b3a7c1f42d88
+Create Date: 2026-08-30 15:05:30.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c94d02e7a519'
+down_revision = 'b3a7c1f42d88'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sig', sa.LargeBinary(length=16), nullable=True))
+        batch_op.create_index(batch_op.f('ix_medicine_sig'), ['sig'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_medicine_sig'))
+        batch_op.drop_column('sig')
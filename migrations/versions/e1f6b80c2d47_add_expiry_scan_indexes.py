@@ -0,0 +1,30 @@
+"""Add composite indexes for the expiry-alert scan
+
+Revision ID: e1f6b80c2d47
+Revises: c94d02e7a519
+Create Date: 2026-08-30 15:07:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f6b80c2d47'
+down_revision = 'c94d02e7a519'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.create_index('ix_medicine_expiry_scan',
+                              ['expiry_date', 'expiry_alert_sent_prior'], unique=False)
+        batch_op.create_index('ix_medicine_expiry_day',
+                              ['expiry_date', 'expiry_alert_sent_expiry_day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('medicine', schema=None) as batch_op:
+        batch_op.drop_index('ix_medicine_expiry_day')
+        batch_op.drop_index('ix_medicine_expiry_scan')
@@ -0,0 +1,27 @@
+"""Add user.list_version for listing cache invalidation
+
+Revision ID: f2c9a61d48b0
+Revises: e1f6b80c2d47
+Create Date: 2026-08-30 15:46:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c9a61d48b0'
+down_revision = 'e1f6b80c2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('list_version', sa.Integer(),
+                                      nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('list_version')
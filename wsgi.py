@@ -0,0 +1,5 @@
+# WSGI entry point for production servers (gunicorn, uWSGI, PythonAnywhere).
+from app import app
+
+if __name__ == '__main__':
+    app.run()